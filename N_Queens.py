@@ -1,5 +1,106 @@
+from functools import partial
 from csp import CSP, StateVariable, BacktrackingSolver
 
+
+def _queens_compatible(rows_apart, a, b):
+    """
+    Queens in columns a and b, rows_apart rows apart, share neither a column nor a diagonal.
+    """
+    return a != b and abs(a - b) != rows_apart
+
+
+class BitmaskCSP(CSP):
+    """
+    An n-queens CSP where each variable is the column of the queen on a fixed row.
+    Occupied columns and diagonals are tracked as three integer bitmasks
+    (cols, diag1, diag2), so checking a candidate column is a single bitwise test
+    instead of a call to every pairwise constraint.
+    The masks mirror the solver's assignment and are cleared by reset when a search starts.
+    """
+    def __init__(self, variables, n, binary_constraints=None):
+        """
+        :param variables: List of StateVariable objects, one per row in row order
+        :param n: size of the board
+        :param binary_constraints: optional pairwise constraints, used by forward checking
+        """
+        super().__init__(variables, binary_constraints)
+        self.n = n
+        self.rows = {var.name: row for row, var in enumerate(variables)}
+        self.reset()
+
+    def reset(self):
+        """
+        Clear the occupancy masks, no queens are placed.
+        """
+        self.cols = 0
+        self.diag1 = 0
+        self.diag2 = 0
+
+    def is_consistent(self, var_name, value, assignment):
+        """
+        A column is consistent iff its column and both diagonals are unoccupied.
+        """
+        row = self.rows[var_name]
+        occupied = (self.cols >> value) | (self.diag1 >> (row + value)) | (self.diag2 >> (row - value + self.n))
+        return not occupied & 1
+
+    def assign(self, var_name, value, assignment):
+        """
+        Place a queen and mark its column and diagonals as occupied.
+        """
+        row = self.rows[var_name]
+        self.cols |= 1 << value
+        self.diag1 |= 1 << (row + value)
+        self.diag2 |= 1 << (row - value + self.n)
+        assignment[var_name] = value
+
+    def unassign(self, var_name, assignment):
+        """
+        Remove a queen and clear its column and diagonal bits.
+        """
+        row = self.rows[var_name]
+        value = assignment.pop(var_name)
+        self.cols ^= 1 << value
+        self.diag1 ^= 1 << (row + value)
+        self.diag2 ^= 1 << (row - value + self.n)
+
+
+def nqueens_solve(n, row, cols, d1, d2, out):
+    """
+    Integer-only recursive n-queens search.
+    :param n: size of the board
+    :param row: row being placed
+    :param cols: bitmask of occupied columns
+    :param d1: bitmask of columns attacked on this row along one diagonal direction
+    :param d2: bitmask of columns attacked on this row along the other diagonal direction
+    :param out: preallocated list; out[row] is set to the chosen column
+    :return: True if rows row..n-1 could all be placed, False otherwise
+    """
+    if row == n:
+        return True
+    full = (1 << n) - 1
+    free = ~(cols | d1 | d2) & full
+    while free:
+        # Try the lowest free column first, same order as the CSP domains
+        bit = free & -free
+        free ^= bit
+        out[row] = bit.bit_length() - 1
+        if nqueens_solve(n, row + 1, cols | bit, ((d1 | bit) << 1) & full, (d2 | bit) >> 1, out):
+            return True
+    return False
+
+
+def solve_n_queens(n):
+    """
+    Solve n-queens directly with nqueens_solve, skipping the generic CSP machinery.
+    :return: dict Queen_i -> column, in the same format as the CSP solvers, or None
+    """
+    out = [0] * n
+    if not nqueens_solve(n, 0, 0, 0, 0, out):
+        return None
+    return {f"Queen_{row + 1}": col for row, col in enumerate(out)}
+
+
 # build the n queens csp
 def build_n_queens_csp(n):
     """
@@ -8,47 +109,42 @@ def build_n_queens_csp(n):
     :return: A CSP instance configured for n-queens
     """
     # 1) Create state variables for each queen: 'Queen_1', 'Queen_2', ...
+    #    Queen_i always sits on row i - 1, so its domain is just the column in [0..n-1]
     variables = []
     for i in range(1, n + 1):
         name = f"Queen_{i}"
-        # Domain: all board positions (row, column) in [1..n]
-        domain = [(row, col) for row in range(1, n + 1) for col in range(1, n + 1)]
-        variables.append(StateVariable(name, domain))
+        variables.append(StateVariable(name, list(range(n))))
 
     # 2) Build all constraints
+    #    BitmaskCSP checks consistency against its occupancy masks, but forward checking
+    #    still needs a pairwise constraint to prune the remaining queens' domains.
     constraints = {}
-    # Initialize each queen with an empty constraint list
     for var in variables:
         constraints[var.name] = []
 
-    # For each pair of queens, add constraints:
+    # For each pair of queens, one fused constraint: different column and not on a
+    # shared diagonal (the rows are fixed, so they are always different).
+    # Pairs the same number of rows apart share one constraint function object.
+    compatible = [partial(_queens_compatible, rows_apart) for rows_apart in range(n)]
     for i in range(1, n + 1):
         queen_a = f"Queen_{i}"
         for j in range(i + 1, n + 1):
             queen_b = f"Queen_{j}"
-            # same column
-            constraints[queen_a].append(
-                (queen_b, lambda a, b: a[0] != b[0])
-            )
-            # same row
             constraints[queen_a].append(
-                (queen_b, lambda a, b: a[1] != b[1])
-            )
-            # diagonal
-            constraints[queen_a].append(
-                (queen_b, lambda a, b: abs(a[0] - b[0]) != abs(a[1] - b[1]))
+                (queen_b, compatible[j - i])
             )
 
     # Return a CSP instance
-    return CSP(variables, constraints)
+    return BitmaskCSP(variables, n, constraints)
 
 
 if __name__ == "__main__":
     n = 7
-    csp_instance = build_n_queens_csp(n)
 
     solver = BacktrackingSolver()
-    solution = solver.naive_solve(csp_instance)
+    solution = solver.naive_solve(build_n_queens_csp(n))
+    print("Solution:", solution)
+    solution = solver.solve_with_forward_checking(build_n_queens_csp(n))
     print("Solution:", solution)
-    solution = solver.solve_with_forward_checking(csp_instance)
+    solution = solve_n_queens(n)
     print("Solution:", solution)
@@ -1,15 +1,78 @@
 import time
 from collections import deque, defaultdict
+from itertools import compress
+from operator import and_, not_
+
+
+# Marks a variable that is missing from an assignment (None could be a real value)
+_UNASSIGNED = object()
+
+
+def with_domain_mask(constraint_func, mask_func, flipped_mask_func=None):
+    """
+    Attach domain-wide versions of a binary constraint to it. Forward checking and LCV use them
+    to test a value against a whole neighbor domain in one call instead of one call per value.
+    :param constraint_func: the binary constraint constraint_func(a, b)
+    :param mask_func: mask_func(a, domain) -> [constraint_func(a, b) for b in domain]
+    :param flipped_mask_func: flipped_mask_func(b, domain) -> [constraint_func(a, b) for a in domain],
+                              can be left out if the constraint is symmetric
+    :return: constraint_func
+    """
+    constraint_func.domain_mask = mask_func
+    constraint_func.flipped_domain_mask = flipped_mask_func if flipped_mask_func is not None else mask_func
+    return constraint_func
+
+
+def _flip(constraint_func):
+    """
+    Wrap a binary constraint so it can be called with its arguments swapped.
+    """
+    flipped = lambda b, a: constraint_func(a, b)
+    if hasattr(constraint_func, "domain_mask"):
+        with_domain_mask(flipped, constraint_func.flipped_domain_mask, constraint_func.domain_mask)
+    return flipped
+
+
+def _all_of(constraint_funcs):
+    """
+    Combine several binary constraints on the same pair of variables into one.
+    """
+    if len(constraint_funcs) == 1:
+        return constraint_funcs[0]
+
+    def combined(a, b):
+        for constraint_func in constraint_funcs:
+            if not constraint_func(a, b):
+                return False
+        return True
+
+    # The combined constraint only gets a domain mask if every part has one
+    if all(hasattr(constraint_func, "domain_mask") for constraint_func in constraint_funcs):
+        def combined_mask(a, domain):
+            mask = constraint_funcs[0].domain_mask(a, domain)
+            for constraint_func in constraint_funcs[1:]:
+                mask = list(map(and_, mask, constraint_func.domain_mask(a, domain)))
+            return mask
+
+        def combined_flipped_mask(b, domain):
+            mask = constraint_funcs[0].flipped_domain_mask(b, domain)
+            for constraint_func in constraint_funcs[1:]:
+                mask = list(map(and_, mask, constraint_func.flipped_domain_mask(b, domain)))
+            return mask
+        with_domain_mask(combined, combined_mask, combined_flipped_mask)
+    return combined
 
 
 class StateVariable:
     """
     Encapsulates a single state variable for the CSP,
-    holding a name and a domain of possible values.
+    holding a name, a domain of possible values, and optional metadata
+    (fields that are the same for every value in the domain).
     """
-    def __init__(self, name, domain):
+    def __init__(self, name, domain, meta=None):
         self.name = name
         self.domain = domain
+        self.meta = meta if meta is not None else {}
 
 
 
@@ -28,6 +91,7 @@ class CSP:
                  value = list of (other_variable_name, constraint_function)
         """
         self.variables = variables
+        self._var_by_name = {var.name: var for var in variables}
         self.solvable = solvable 
         self.verbose = 0
         self.binary_constraints = binary_constraints if binary_constraints else {}
@@ -40,6 +104,30 @@ class CSP:
             if var.name not in self.unary_constraints:
                 self.unary_constraints[var.name] = []
 
+        # Symmetric adjacency: neighbors[var_name] -> list of (neighbor_name, constraint_function)
+        # where constraint_function always takes (value of var_name, value of neighbor).
+        # Each binary constraint is stored once per direction so a consistency check
+        # only has to look at the constraints touching the variable being assigned.
+        self.neighbors = {var.name: [] for var in self.variables}
+        for var_name, constraints in self.binary_constraints.items():
+            for neighbor, constraint_func in constraints:
+                self.neighbors.setdefault(var_name, []).append((neighbor, constraint_func))
+                self.neighbors.setdefault(neighbor, []).append((var_name, _flip(constraint_func)))
+
+        # The same adjacency with neighbor names resolved to their StateVariable objects once,
+        # and all constraints between a pair combined into one predicate, so the search
+        # loops scan each neighbor's domain once and never look variables up by name
+        self._neighbor_vars = {}
+        for var_name, neighbors in self.neighbors.items():
+            by_neighbor = {}
+            for neighbor, constraint_func in neighbors:
+                if neighbor in self._var_by_name:
+                    by_neighbor.setdefault(neighbor, []).append(constraint_func)
+            self._neighbor_vars[var_name] = [
+                (self._var_by_name[neighbor], _all_of(constraint_funcs))
+                for neighbor, constraint_funcs in by_neighbor.items()
+            ]
+
     def is_complete(self, assignment):
         """
         Checks if every variable is assigned.
@@ -51,10 +139,14 @@ class CSP:
                 return False
         return True
 
-    def select_unassigned_variable(self, assignment):
+    def select_unassigned_variable(self, assignment, depth=None):
         """
         Selects the first unassigned variable.
+        :param depth: optional number of variables assigned so far. Solvers that always
+                      assign variables in list order pass this to skip the scan.
         """
+        if depth is not None:
+            return self.variables[depth] if depth < len(self.variables) else None
         for var in self.variables:
             if var.name not in assignment:
                 return var
@@ -64,42 +156,61 @@ class CSP:
         """
         Return the domain of a given variable.
         """
-        for var in self.variables:
-            if var.name == var_name:
-                return var.domain
-        return []
+        var = self._var_by_name.get(var_name)
+        return var.domain if var else []
 
     def is_consistent(self, var_name, value, assignment):
         """
         Check consistency of a potential (var_name, value) with the existing assignment.
-        This checks the relevant constraints for var_name against already-assigned neighbors.
+        Only the constraints involving var_name are checked: every other pair of
+        assigned variables was already checked when the later of the two was assigned.
+        """
+        for constraint_func in self.unary_constraints[var_name]:
+            if not constraint_func(value):
+                return False  # Constraint violated
+        # One assignment lookup per neighbor, checked against all constraints of the pair at once
+        for neighbor_var, constraint_func in self._neighbor_vars[var_name]:
+            neighbor_value = assignment.get(neighbor_var.name, _UNASSIGNED)
+            # Check only if neighbor has been assigned
+            if neighbor_value is not _UNASSIGNED and not constraint_func(value, neighbor_value):
+                return False  # Constraint violated
+        return True  # All constraints satisfied
+
+    def assign(self, var_name, value, assignment):
+        """
+        Record var_name = value in the assignment.
+        Subclasses that track extra search state can override this (and unassign).
         """
-        # Temporarily assign the value
         assignment[var_name] = value
-        # print(f"Checking if assignment is consistent at depth {depth}: ", assignment_check)
-        for state, val in assignment.items():
-            if state in self.binary_constraints:
-                for neighbor, constraint_func in self.binary_constraints[state]:
-                    if neighbor in assignment:  # Check only if neighbor has been assigned
-                        if not constraint_func(val, assignment[neighbor]):
-                            del assignment[var_name]
-                            return False  # Constraint violated
-            if state in self.unary_constraints:
-                for constraint_func in self.unary_constraints[state]:
-                    if not constraint_func(val):
-                        del assignment[var_name]
-                        return False  # Constraint violated
+
+    def unassign(self, var_name, assignment):
+        """
+        Remove var_name from the assignment, undoing assign.
+        """
         del assignment[var_name]
-        
-        
-        return True  # All constraints satisfied
+
+    def reset(self):
+        """
+        Clear any search state kept by assign/unassign. The solvers call this before each search
+        starting from an empty assignment. Subclasses that track extra search state override it.
+        """
     
 class BacktrackingSolver:
     """
     A solver class for backtracking search on a CSP.
     """
-    def __init__(self):
+    def __init__(self, mrv=False, lcv=False):
+        """
+        :param mrv: pick the unassigned variable with the fewest remaining values during forward checking
+        :param lcv: try values that prune the fewest neighbor values first during forward checking
+        """
         self.depth = 0
+        self.mrv = mrv
+        self.lcv = lcv
+        # Reused by every forward checking search: the (StateVariable, removed values) entries
+        # pruned so far, and for each search level with a value assigned, where its entries start
+        self._prune_stack = []
+        self._prune_marks = []
 
     def naive_solve(self, csp, verbose = 0):
         """
@@ -110,6 +221,7 @@ class BacktrackingSolver:
         if verbose >= 1:
             print("Beginning search")
         self.verbose = verbose
+        csp.reset()
         ret = self.naive_backtrack(csp, {})
         end_time = time.time()
         # Calculate and print execution time
@@ -119,47 +231,63 @@ class BacktrackingSolver:
     
     def naive_backtrack(self, csp, assignment):
         """
-        The main recursive backtracking function.
+        The main backtracking function.
+        The search is iterative: each level of the search tree is a frame on an explicit
+        stack holding [variable name, iterator over its remaining values, whether a value is assigned].
         :param csp: The CSP instance
         :param assignment: Current partial assignment (dict: var_name -> value)
         :param verbose: 0 = no terminal output, 1 = minimal terminal output, 2 = maximum terminal output
         
         :return: A complete assignment if found, or None if no solution is possible
         """
-        if self.verbose >= 1: 
-            print("checking for completeness")
-        if csp.is_complete(assignment):
-            return assignment
-
-        var = csp.select_unassigned_variable(assignment)
-        if var is None:
-            return None  # Should not happen if csp.is_complete is correct
-
-        for value in csp.order_domain_values(var.name):
-            # if self.verbose == 2:
-            #     print(f"trying to assign variable: {var.name} value: {value}")
-            if csp.is_consistent(var.name, value, assignment):
-                # Try assigning this value
-                assignment[var.name] = value
-                
-                if self.verbose == 2:
-                    print(f"current state assignment {assignment} is consistent.")
+        stack = []
+        descend = True
+        while True:
+            if descend:
+                descend = False
                 if self.verbose >= 1: 
-                    print("Recursing further")
+                    print("checking for completeness")
+                if csp.is_complete(assignment):
+                    return assignment
 
-                result = self.naive_backtrack(csp, assignment)
-                if result is not None:
-                    return result
-                
+                var = csp.select_unassigned_variable(assignment, len(assignment))
+                # None should not happen if csp.is_complete is correct, backtrack
+                if var is not None:
+                    stack.append([var.name, iter(csp.order_domain_values(var.name)), False])
+
+            if not stack:
+                return None  # Every value of the first variable failed => no solution
+
+            frame = stack[-1]
+            var_name, values, assigned = frame
+            if assigned:
+                # Coming back up: the value tried at this level had no solution below it
                 if self.verbose == 2:
-                    print(f"current state assignment {assignment} had no further valid solutions, so {var.name}'s assignment of {value} is being removed.")
+                    print(f"current state assignment {assignment} had no further valid solutions, so {var_name}'s assignment of {assignment[var_name]} is being removed.")
                 if self.verbose >= 1: 
                     print("Backtracking")
                 
                 # Backtrack (remove the assignment)
-                del assignment[var.name]
+                csp.unassign(var_name, assignment)
+                frame[2] = False
 
-        return None
+            for value in values:
+                # if self.verbose == 2:
+                #     print(f"trying to assign variable: {var_name} value: {value}")
+                if csp.is_consistent(var_name, value, assignment):
+                    # Try assigning this value
+                    csp.assign(var_name, value, assignment)
+                    
+                    if self.verbose == 2:
+                        print(f"current state assignment {assignment} is consistent.")
+                    if self.verbose >= 1: 
+                        print("Recursing further")
+
+                    frame[2] = True
+                    descend = True
+                    break
+            else:
+                stack.pop()  # No valid value found for this variable => backtrack
 
     def solve_with_forward_checking(self, csp, verbose=0):
         """
@@ -168,8 +296,12 @@ class BacktrackingSolver:
         start_time = time.time()
         print(f"Starting at {time.ctime(start_time)  }")
         self.verbose = verbose
+        csp.reset()
         # We assume the domains in csp.variables are the live, modifiable domains.
-        ret  = self.backtrack_with_forward_check(csp, assignment={})
+        if self.ac3(csp):
+            ret = self.backtrack_with_forward_check(csp, assignment={})
+        else:
+            ret = None  # AC-3 emptied a domain, no solution exists
         end_time = time.time()
         # Calculate and print execution time
         execution_time = end_time - start_time
@@ -185,7 +317,11 @@ class BacktrackingSolver:
     
     def backtrack_with_forward_check(self, csp, assignment):
         """
-        The main recursive backtracking function that includes forward checking.
+        The main backtracking search that includes forward checking.
+        The search is iterative: each level of the search tree is a frame on an explicit
+        stack holding [variable name, iterator over its remaining values, whether a value is assigned].
+        All pruned values go on the solver's _prune_stack; _prune_marks holds, per level with an
+        assigned value, where the pruning for that value starts, so undoing it pops back to the mark.
         """
         if not csp.solvable: 
             return {
@@ -193,39 +329,173 @@ class BacktrackingSolver:
                 "trucks": None,
                 "forklifts": None
             }
-        
-        if csp.is_complete(assignment):
-            # Found a solution
-            return assignment
-
-        # Pick an unassigned variable
-        var = csp.select_unassigned_variable(assignment)
-        if var is None:
-            return None  # No unassigned variable found -> no solution or unexpected
-
-        var_name = var.name
-        # For each value in var's domain
-        for value in csp.order_domain_values(var_name):
-            if csp.is_consistent(var_name, value, assignment):
-                # Tentatively assign var = value
-                assignment[var_name] = value
-
-                # RECORD of pruned values: pruned[var_name] = list of domain values removed
-                pruned = defaultdict(list)
-
-                # 1) Forward Check: prune neighbors' domains 
-                if self.forward_check(csp, assignment, var_name, value, pruned):
-                    # 2) If forward check didn't fail, recurse
-                    result = self.backtrack_with_forward_check(csp, assignment)
-                    if result is not None:
-                        return result
-
-                # 3) If we’re here, either forward check failed or recursion failed,
-                #    so we must UNDO the prunes and the assignment
-                self.restore_pruned_values(csp, pruned)
-                del assignment[var_name]
-
-        return None  # No valid value found for this variable => backtrack
+
+        pruned_stack = self._prune_stack
+        prune_marks = self._prune_marks
+        del pruned_stack[:]
+        del prune_marks[:]
+        stack = []
+        descend = True
+        while True:
+            if descend:
+                descend = False
+                if csp.is_complete(assignment):
+                    # Found a solution
+                    return assignment
+
+                # Pick an unassigned variable
+                if self.mrv:
+                    var = self.select_unassigned_variable_mrv(csp, assignment)
+                else:
+                    var = csp.select_unassigned_variable(assignment, len(assignment))
+                # No unassigned variable found -> no solution or unexpected, backtrack
+                if var is not None:
+                    if self.lcv:
+                        values = self.order_domain_values_lcv(csp, var, assignment)
+                    else:
+                        values = csp.order_domain_values(var.name)
+                    stack.append([var.name, iter(values), False])
+
+            if not stack:
+                return None  # Every value of the first variable failed => no solution
+
+            frame = stack[-1]
+            var_name, values, assigned = frame
+            if assigned:
+                # Coming back up: the value tried at this level had no solution below it,
+                # so UNDO its prunes and the assignment before trying the next one
+                self.restore_pruned_values(csp, pruned_stack, prune_marks.pop())
+                csp.unassign(var_name, assignment)
+                frame[2] = False
+
+            # For each remaining value in var's domain
+            for value in values:
+                if csp.is_consistent(var_name, value, assignment):
+                    # Tentatively assign var = value
+                    csp.assign(var_name, value, assignment)
+                    prune_marks.append(len(pruned_stack))
+
+                    # 1) Forward Check: prune neighbors' domains
+                    if self.forward_check(csp, assignment, var_name, value, pruned_stack):
+                        # 2) If forward check didn't fail, descend
+                        frame[2] = True
+                        descend = True
+                        break
+
+                    # 3) Forward check failed, UNDO the prunes and the assignment
+                    self.restore_pruned_values(csp, pruned_stack, prune_marks.pop())
+                    csp.unassign(var_name, assignment)
+            else:
+                stack.pop()  # No valid value found for this variable => backtrack
+
+    def ac3(self, csp):
+        """
+        Make every arc of the CSP consistent before search (AC-3).
+        Values that fail a unary constraint, or that have no supporting value in some
+        neighbor's domain, can never be part of a solution and are removed for good.
+        :param csp: The CSP instance, its domains are pruned in place
+        :return: False if some domain was wiped out (no solution), True otherwise
+        """
+        # Node consistency
+        for var in csp.variables:
+            unary = csp.unary_constraints[var.name]
+            if unary:
+                var.domain[:] = [val for val in var.domain if all(constraint_func(val) for constraint_func in unary)]
+                if not var.domain:
+                    return False
+
+        # Group the constraints of each arc (Xi, Xj) so revise checks them together
+        arcs = defaultdict(list)
+        for var_name, neighbors in csp.neighbors.items():
+            for neighbor, constraint_func in neighbors:
+                arcs[(var_name, neighbor)].append(constraint_func)
+
+        # Residual supports per arc, kept across revisions of that arc
+        residues = defaultdict(dict)
+
+        queue = deque(arcs)
+        queued = set(arcs)
+        while queue:
+            arc = queue.popleft()
+            queued.discard(arc)
+            xi, xj = arc
+            if self.revise(csp, xi, xj, arcs[arc], residues[arc]):
+                if not csp._var_by_name[xi].domain:
+                    return False
+                for xk, _ in csp.neighbors[xi]:
+                    if xk != xj and (xk, xi) not in queued:
+                        queue.append((xk, xi))
+                        queued.add((xk, xi))
+        return True
+
+    def revise(self, csp, xi, xj, constraint_funcs, residues=None):
+        """
+        Remove the values of Xi that have no value in Xj's domain satisfying every
+        constraint in constraint_funcs.
+        :param residues: optional dict to reuse across revisions of the same arc. It remembers,
+                         for each value of Xi (by id), the value of Xj that last supported it;
+                         while that value is still in Xj's domain it is a support again, and
+                         Xj's domain does not need to be scanned (residual supports)
+        :return: True if Xi's domain was changed
+        """
+        xi_domain = csp._var_by_name[xi].domain
+        xj_domain = csp._var_by_name[xj].domain
+        constraint_func = _all_of(constraint_funcs)
+        if residues is None:
+            residues = {}
+        xj_alive = {id(y) for y in xj_domain}
+        supported = []
+        for x in xi_domain:
+            residue = residues.get(id(x), _UNASSIGNED)
+            if residue is not _UNASSIGNED and id(residue) in xj_alive:
+                supported.append(x)
+                continue
+            for y in xj_domain:
+                if constraint_func(x, y):
+                    residues[id(x)] = y
+                    supported.append(x)
+                    break
+        if len(supported) == len(xi_domain):
+            return False
+        xi_domain[:] = supported
+        return True
+
+    def select_unassigned_variable_mrv(self, csp, assignment):
+        """
+        Minimum remaining values: select the unassigned variable with the smallest
+        current (forward checked) domain. Ties go to the variable constrained with the
+        most other variables (degree heuristic), then to the earliest variable.
+        """
+        neighbor_vars = csp._neighbor_vars
+        return min(
+            (v for v in csp.variables if v.name not in assignment),
+            key=lambda v: (len(v.domain), -len(neighbor_vars[v.name])),
+            default=None
+        )
+
+    def order_domain_values_lcv(self, csp, var, assignment):
+        """
+        Least constraining value: order var's domain so that values which would prune
+        the fewest values from unassigned neighbors' domains come first.
+        This is a dry run of forward_check for every value, nothing is pruned.
+        """
+        unassigned_neighbors = [
+            (neighbor_var.domain, constraint_func)
+            for neighbor_var, constraint_func in csp._neighbor_vars[var.name]
+            if neighbor_var.name not in assignment
+        ]
+
+        def pruned_count(value):
+            count = 0
+            for neighbor_domain, constraint_func in unassigned_neighbors:
+                domain_mask = getattr(constraint_func, "domain_mask", None)
+                if domain_mask is not None:
+                    count += domain_mask(value, neighbor_domain).count(False)
+                else:
+                    count += sum(1 for neighbor_val in neighbor_domain if not constraint_func(value, neighbor_val))
+            return count
+
+        return sorted(var.domain, key=pruned_count)
 
     def forward_check(self, csp, assignment, var_name, value, pruned):
         """
@@ -237,33 +507,41 @@ class BacktrackingSolver:
         :param assignment: Current partial assignment
         :param var_name: Name of the variable just assigned
         :param value: Value assigned to var_name
-        :param pruned: A dictionary to keep track of pruned values so we can restore them
+        :param pruned: A list to append (StateVariable, list of domain values removed) to so we can restore them
         :return: True if forward checking succeeded, False if it found an empty domain
         """
-        # For every neighbor that has constraints with var_name
-        for (neighbor, constraint_func) in csp.binary_constraints[var_name]:
+        # For every neighbor that has constraints with var_name (in either direction)
+        for (neighbor_var, constraint_func) in csp._neighbor_vars[var_name]:
             # Only prune if neighbor is not yet assigned
-            if neighbor not in assignment:
-                # Find the neighbor's StateVariable object
-                neighbor_var = next((v for v in csp.variables if v.name == neighbor), None)
-                if not neighbor_var:
-                    continue  # Safety check
-
-                # We’ll build a list of domain values to remove
-                to_remove = []
-
-                # For each candidate in the neighbor's domain:
-                for neighbor_val in neighbor_var.domain:
-                    # Check constraint between the newly assigned (var_name=value) 
-                    # and neighbor=(neighbor_val)
-                    # If it violates the constraint, we remove neighbor_val
-                    if not constraint_func(value, neighbor_val):
-                        to_remove.append(neighbor_val)
-
-                # Now apply the pruning
-                for val in to_remove:
-                    neighbor_var.domain.remove(val)
-                    pruned[neighbor].append(val)
+            if neighbor_var.name not in assignment:
+                domain_mask = getattr(constraint_func, "domain_mask", None)
+                if domain_mask is not None:
+                    # Test the whole domain at once and split it on the resulting mask
+                    mask = domain_mask(value, neighbor_var.domain)
+                    kept = list(compress(neighbor_var.domain, mask))
+                    removed = []
+                    if len(kept) != len(neighbor_var.domain):
+                        removed = list(compress(neighbor_var.domain, map(not_, mask)))
+                else:
+                    # Split the neighbor's domain into the values we keep and the ones we prune
+                    # in a single pass, rather than calling list.remove once per pruned value
+                    kept = []
+                    removed = []
+
+                    # For each candidate in the neighbor's domain:
+                    for neighbor_val in neighbor_var.domain:
+                        # Check constraint between the newly assigned (var_name=value) 
+                        # and neighbor=(neighbor_val)
+                        # If it violates the constraint, we remove neighbor_val
+                        if constraint_func(value, neighbor_val):
+                            kept.append(neighbor_val)
+                        else:
+                            removed.append(neighbor_val)
+
+                # Now apply the pruning (in place, the domain list is shared with the solver)
+                if removed:
+                    neighbor_var.domain[:] = kept
+                    pruned.append((neighbor_var, removed))
 
                 # If domain becomes empty => fail forward check
                 if len(neighbor_var.domain) == 0:
@@ -271,13 +549,13 @@ class BacktrackingSolver:
                 
         return True
 
-    def restore_pruned_values(self, csp, pruned):
+    def restore_pruned_values(self, csp, pruned, mark=0):
         """
-        Undo the domain pruning recorded in 'pruned'.
+        Undo the domain pruning recorded in 'pruned' from index mark onwards.
         :param csp: The CSP instance
-        :param pruned: dict => var_name -> list of domain values removed
+        :param pruned: list => (StateVariable, list of domain values removed), as filled by forward_check
+        :param mark: length 'pruned' had before the pruning to undo
         """
-        for var_name, vals in pruned.items():
-            neighbor_var = next((v for v in csp.variables if v.name == var_name), None)
-            if neighbor_var:
-                neighbor_var.domain.extend(vals)
\ No newline at end of file
+        for neighbor_var, vals in pruned[mark:]:
+            neighbor_var.domain.extend(vals)
+        del pruned[mark:]
@@ -1,17 +1,38 @@
 import json
+import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
-from datetime import datetime, timedelta
 import sys
+from operator import itemgetter
 
-def parse_int_time(t):
-    hour = t // 100
-    minute = t % 100
-    return datetime(2025, 1, 1, hour, minute)
+try:
+    # orjson parses much faster than the stdlib json module, use it when it is installed
+    import orjson
+except ImportError:
+    orjson = None
+
+def parse_int_times(times):
+    """Convert a sequence of HHMM integers to an array of datetime64 values on a fixed day."""
+    times = np.asarray(times, dtype=np.int64)
+    base = np.datetime64('2025-01-01T00:00')
+    return base + (times // 100).astype('timedelta64[h]') + (times % 100).astype('timedelta64[m]')
+
+def add_minutes(t, minutes):
+    """Add minutes to an HHMM integer, returning an HHMM integer."""
+    hour, minute = divmod(t // 100 * 60 + t % 100 + minutes, 60)
+    return hour * 100 + minute
+
+def format_int_time(t):
+    """Format an HHMM integer as HH:MM."""
+    return f"{t // 100:02d}:{t % 100:02d}"
 
 def visualize_single_plot_datetime(schedule_path="schedule.json"):
-    with open(schedule_path, 'r') as f:
-        data = json.load(f)
+    if orjson is not None:
+        with open(schedule_path, 'rb') as f:
+            data = orjson.loads(f.read())
+    else:
+        with open(schedule_path, 'r') as f:
+            data = json.load(f)
 
     aircraft_data = data.get("aircraft", {})
     trucks_data = data.get("trucks", {})
@@ -27,14 +48,14 @@ def visualize_single_plot_datetime(schedule_path="schedule.json"):
     # [1] AIRCRAFT
     aircraft_sorted = sorted(aircraft_data.items(), key=lambda x: x[1]["Arrival"])
     for ac_name, info in aircraft_sorted:
-        start_dt = parse_int_time(info["Arrival"])
-        end_dt = parse_int_time(info["Departure"])
+        start = info["Arrival"]
+        end = info["Departure"]
         plot_bars.append({
             "y": current_y,
-            "start": start_dt,
-            "end": end_dt,
+            "start": start,
+            "end": end,
             "label": f"{ac_name}\nHangar: {info['Hangar']} "
-                     f"({start_dt.strftime('%H:%M')}-{end_dt.strftime('%H:%M')})"
+                     f"({format_int_time(start)}-{format_int_time(end)})"
         })
         y_labels.append(ac_name)
         current_y += 1
@@ -45,14 +66,14 @@ def visualize_single_plot_datetime(schedule_path="schedule.json"):
     # [2] TRUCKS
     trucks_sorted = sorted(trucks_data.items(), key=lambda x: x[1]["Arrival"])
     for truck_name, info in trucks_sorted:
-        start_dt = parse_int_time(info["Arrival"])
-        end_dt   = parse_int_time(info["Departure"])
+        start = info["Arrival"]
+        end   = info["Departure"]
         plot_bars.append({
             "y": current_y,
-            "start": start_dt,
-            "end": end_dt,
+            "start": start,
+            "end": end,
             "label": f"{truck_name}\nHangar: {info['Hangar']} "
-                     f"({start_dt.strftime('%H:%M')}-{end_dt.strftime('%H:%M')})"
+                     f"({format_int_time(start)}-{format_int_time(end)})"
         })
         y_labels.append(truck_name)
         current_y += 1
@@ -68,38 +89,49 @@ def visualize_single_plot_datetime(schedule_path="schedule.json"):
         fk_y = current_y
         current_y += 1
 
-        jobs = sorted(forklifts_data[fk_name], key=lambda j: j["Time"])
+        jobs = sorted(forklifts_data[fk_name], key=itemgetter("Time"))
         for job in jobs:
-            start_dt = parse_int_time(job["Time"])
+            start = job["Time"]
             duration = forklift_durations.get(job["Job"], 0)
-            # Use Python's datetime.timedelta to add minutes
-            end_dt = start_dt + timedelta(minutes=duration)
+            end = add_minutes(start, duration)
 
             job_str = (f"{job['Job'][0]} @ {job['Hangar'][0]} "
-                       f"({start_dt.strftime('%H:%M')}-{end_dt.strftime('%H:%M')})")
+                       f"({format_int_time(start)}-{format_int_time(end)})")
             plot_bars.append({
                 "y": fk_y,
-                "start": start_dt,
-                "end": end_dt,
+                "start": start,
+                "end": end,
                 "label": job_str
             })
 
     fig, ax = plt.subplots()
 
-    all_dates = []
-    for bar in plot_bars:
-        start_num = mdates.date2num(bar["start"])
-        end_num = mdates.date2num(bar["end"])
-        width = end_num - start_num
+    # Convert every bar's start and end (HHMM integers) to Matplotlib date numbers in one batch each
+    starts = mdates.date2num(parse_int_times([bar["start"] for bar in plot_bars]))
+    ends = mdates.date2num(parse_int_times([bar["end"] for bar in plot_bars]))
+    # Draw each row's bars as one collection instead of one Rectangle per bar.
+    # Bars keep the colors barh would have given them by cycling per bar.
+    colors = plt.rcParams["axes.prop_cycle"].by_key()["color"]
+    rows = {}
+    for i, bar in enumerate(plot_bars):
+        rows.setdefault(bar["y"], []).append(i)
+    for y, indices in rows.items():
+        ax.broken_barh(
+            [(starts[i], ends[i] - starts[i]) for i in indices],
+            (y - 0.4, 0.8),
+            facecolors=[colors[i % len(colors)] for i in indices]
+        )
 
-        ax.barh(bar["y"], width, left=start_num, align='center')
+    for i, bar in enumerate(plot_bars):
+        start_num = starts[i]
+        end_num = ends[i]
         midpoint = (start_num + end_num) / 2
         ax.text(
             midpoint, bar["y"],
             bar["label"],
             ha='center', va='center', fontsize=8, rotation = 30
         )
-        all_dates.extend([start_num, end_num])
+    all_dates = np.concatenate([starts, ends])
 
     # Y-axis labels
     y_positions = list(range(len(y_labels)))
@@ -116,9 +148,9 @@ def visualize_single_plot_datetime(schedule_path="schedule.json"):
     # ax.xaxis.set_major_locator(mdates.MinuteLocator(interval=15))
 
     # Pad the x-limits
-    if all_dates:
-        min_x = min(all_dates) - (1 / 1440) * 10  # 10 minutes
-        max_x = max(all_dates) + (1 / 1440) * 10
+    if all_dates.size:
+        min_x = all_dates.min() - (1 / 1440) * 10  # 10 minutes
+        max_x = all_dates.max() + (1 / 1440) * 10
         ax.set_xlim(min_x, max_x)
 
     ax.set_xlabel("Time (HH:MM)")
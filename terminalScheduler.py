@@ -1,62 +1,117 @@
 import json
+import os
 import sys
-from csp import CSP, StateVariable, BacktrackingSolver
-from datetime import datetime, timedelta
+from csp import CSP, StateVariable, BacktrackingSolver, with_domain_mask
+from collections import defaultdict, namedtuple
 from itertools import product
 
-def datetime_to_military(dt):
-    """Turn a datetime into an Integer based on the .json output specifications"""
-    return int(dt.strftime("%H%M"))
+try:
+    # orjson serializes much faster than the stdlib json module, use it when it is installed
+    import orjson
+except ImportError:
+    orjson = None
 
-def convert_datetimes(obj):
+# How long (in minutes) a forklift is busy unloading an aircraft and loading a truck
+UNLOAD_DURATION = 20
+LOAD_DURATION = 5
+# A truck's load has to start more than this many minutes after the unload of its cargo starts
+MIN_UNLOAD_TO_LOAD_GAP = 15
+# Minutes between consecutive valid times, every job and aircraft move starts on this grid
+TIME_STEP = 5
+
+# Domain values of the aircraft and forklift job state variables. Every variable has thousands of values, so they
+# are stored as light weight tuples instead of dicts (fields shared by all values are in the variable's metadata).
+AircraftValue = namedtuple("AircraftValue", ["hangar_assignment", "hangar_arrival_time", "departure_time"])
+LoadJobValue = namedtuple("LoadJobValue", ["forklift_name", "arrival_time", "hangar_assignment"])
+UnloadJobValue = namedtuple("UnloadJobValue", ["forklift_name", "arrival_time"])
+
+def military_to_minutes(military_time):
+    """Turn an Integer military time from the .json input (ex: 1345) into minutes since midnight"""
+    return military_time // 100 * 60 + military_time % 100
+
+def minutes_to_military(minutes):
+    """Turn minutes since midnight into an Integer based on the .json output specifications"""
+    hours, minutes = divmod(minutes, 60)
+    return hours * 100 + minutes
+
+def convert_times(obj):
     """
-    Recursively traverse obj (which can be a dict, list, or nested combinations).
-    Whenever a datetime object is found, convert it with `datetime_to_military`.
+    Traverse obj (which can be a dict, list, or nested combinations) and return a copy of it where
+    times are in the .json output format. Times are stored as minutes since midnight, so every value
+    under a key ending in "_time" is converted with `minutes_to_military`.
+    The traversal uses an explicit stack instead of recursion, and obj itself is left unchanged since
+    the solution is still used to build the schedule after it is written out.
     """
-    if isinstance(obj, dict):
-        # Recursively process each key-value pair
-        return {k: convert_datetimes(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        # Recursively process each element of the list
-        return [convert_datetimes(item) for item in obj]
-    elif isinstance(obj, datetime):
-        # Convert datetime objects to int
-        return datetime_to_military(obj)
-    else:
+    if not isinstance(obj, (dict, list)):
         # Leave all other types as is
         return obj
+    converted = {} if isinstance(obj, dict) else []
+    # Stack of (original container, its converted copy still being filled in)
+    stack = [(obj, converted)]
+    while stack:
+        original, copy = stack.pop()
+        if isinstance(original, dict):
+            items = original.items()
+        else:
+            items = enumerate(original)
+        for k, v in items:
+            if isinstance(v, (dict, list)):
+                v_copy = {} if isinstance(v, dict) else []
+                stack.append((v, v_copy))
+            elif isinstance(k, str) and k.endswith("_time"):
+                v_copy = minutes_to_military(v)
+            else:
+                v_copy = v
+            if isinstance(copy, dict):
+                copy[k] = v_copy
+            else:
+                copy.append(v_copy)
+    return converted
 
 
-def find_forklift_jobs(solution, forklift_name):
+def index_solution(solution):
     """
-    Given a CSP solution, find and return any forklift jobs for forklift with name forklift_name.
+    Index the forklift jobs of a CSP solution in a single pass, so the schedule can be built without
+    re-scanning the whole solution for every truck and forklift.
+    :return: (load_jobs_by_truck, jobs_by_forklift) where load_jobs_by_truck maps a truck name to its load job
+             and jobs_by_forklift maps a forklift name to a list of (job, details) in solution order
     """
-    forklift_jobs = []
+    load_jobs_by_truck = {}
+    jobs_by_forklift = defaultdict(list)
     for job, details in solution.items():
-        if job.startswith('forklift_') and details.get('forklift_name') == forklift_name:
-            job_type = 'Load' if '_load_' in job else 'Unload'
-            associated_aircraft = find_associated_aircraft(solution, details.get('associated_aircraft_name'))
-            forklift_jobs.append({
-                'Hangar': associated_aircraft["hangar_assignment"],
-                'Time': datetime_to_military(details.get('arrival_time')),
-                'Job': job_type
-            })
+        if job.startswith('forklift_'):
+            jobs_by_forklift[details.get('forklift_name')].append((job, details))
+            if job.startswith("forklift_load_job"):
+                load_jobs_by_truck.setdefault(details.get('associated_truck_name'), details)
+    
+    return load_jobs_by_truck, jobs_by_forklift
+
+def find_forklift_jobs(solution, jobs_by_forklift, forklift_name):
+    """
+    Given a CSP solution and its jobs_by_forklift index (see index_solution), find and return any 
+    forklift jobs for forklift with name forklift_name.
+    """
+    forklift_jobs = []
+    for job, details in jobs_by_forklift.get(forklift_name, []):
+        job_type = 'Load' if '_load_' in job else 'Unload'
+        associated_aircraft = find_associated_aircraft(solution, details.get('associated_aircraft_name'))
+        forklift_jobs.append({
+            'Hangar': associated_aircraft["hangar_assignment"],
+            'Time': minutes_to_military(details.get('arrival_time')),
+            'Job': job_type
+        })
     
     return forklift_jobs
 
-def find_associated_load_job(solution, truck_name):
+def find_associated_load_job(load_jobs_by_truck, truck_name):
     """
     Trucks are wrapped into Load jobs for simplicity, meaning a trucks arrival, derparture, and hangar 
     are all the same as the load job. This is achieved by associating a truck with each load job through 
     the associated_truck_name variable and then placing constraints on that variable (ex: 2 trucks cannot
     be in the same hangar at the same time). This function finds the load job associated with a given truck
-    and returns it.
+    in the load_jobs_by_truck index (see index_solution) and returns it.
     """
-    for job, details in solution.items():
-        if job.startswith("forklift_load_job") and details.get('associated_truck_name') == truck_name:
-            return details
-    
-    return {}
+    return load_jobs_by_truck.get(truck_name, {})
 
 def find_associated_aircraft(solution, aircraft_name):
     """
@@ -67,17 +122,30 @@ def find_associated_aircraft(solution, aircraft_name):
     have the same associated aircrafts). This function finds the aircraft associated with a given aircraft
     name and returns it.
     """
-    for var, details in solution.items():
-        if var == aircraft_name:
-            return details
-    
-    return {}
+    return solution.get(aircraft_name, {})
+
+# Parsed JSON files: file path -> (modification time, size, data), so loading an unchanged file again skips parsing
+_json_cache = {}
 
 def load_json(file_path):
-    """Load JSON data from a file."""
+    """Load JSON data from a file. Files that did not change since they were last loaded are not parsed again."""
     try:
-        with open(file_path, 'r') as file:
-            return json.load(file)
+        stat = os.stat(file_path)
+        cached = _json_cache.get(file_path)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        if stat.st_size == 0:
+            # An empty file is never valid JSON, no need to read it
+            print(f"Error: File {file_path} is not a valid JSON file.")
+            sys.exit(1)
+        if orjson is not None:
+            with open(file_path, 'rb') as file:
+                data = orjson.loads(file.read())
+        else:
+            with open(file_path, 'r') as file:
+                data = json.load(file)
+        _json_cache[file_path] = (stat.st_mtime_ns, stat.st_size, data)
+        return data
     except FileNotFoundError:
         print(f"Error: File {file_path} not found.")
         sys.exit(1)
@@ -85,73 +153,214 @@ def load_json(file_path):
         print(f"Error: File {file_path} is not a valid JSON file.")
         sys.exit(1)
        
+def dump_json(data, file_path):
+    """Write data to a JSON file (indented by 2 spaces with orjson, 4 with the stdlib json module)."""
+    if orjson is not None:
+        with open(file_path, 'wb') as file:
+            file.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(file_path, 'w') as file:
+            json.dump(data, file, indent=4)
+       
 def generate_time_intervals(start_time: int, end_time: int):
-    """Generate all datetimes between input start and start time in 5 minute intervals"""
-    # Convert integers to datetime objects
-    start_dt = datetime.strptime(f"{start_time:04d}", "%H%M")
-    end_dt = datetime.strptime(f"{end_time:04d}", "%H%M")
-    
-    # Generate all 5-minute intervals
-    time_intervals = []
-    current_dt = start_dt
-    while current_dt < end_dt:
-        time_intervals.append(current_dt)
-        print(current_dt)
-        current_dt += timedelta(minutes=5)
-    print(end_dt)
-
-    return time_intervals
-
-def generate_aircraft_domain(valid_times, hangars, aircraft_name, cargo_amount, terminal_arrival_time):
-    """Generate the domain for given Aircraft state variable"""
+    """Generate all times (in minutes since midnight) between input start and stop time in 5 minute intervals"""
+    return list(range(military_to_minutes(start_time), military_to_minutes(end_time), TIME_STEP))
+
+def generate_aircraft_domain(valid_times, hangars, terminal_arrival_time):
+    """
+    Generate the domain for given Aircraft state variable as a list of AircraftValue.
+    The aircraft name, cargo amount and terminal arrival time are the same for every value, so they
+    are kept in the state variable's metadata instead.
+    """
     domain = []
+    if not valid_times:
+        return domain
+    # valid_times are consecutive 5 minute steps, so every departure a multiple of 20 minutes after
+    # the arrival (and still inside the valid times) can be stepped to directly
+    last_valid_time = valid_times[-1]
+    arrival_times = [arrival_time for arrival_time in valid_times if arrival_time >= terminal_arrival_time]
     
     # Generate all possible state combinations
-    for hangar, arrival_time in product(hangars, valid_times):
+    for hangar, arrival_time in product(hangars, arrival_times):
         # Ensure departure time is after arrival time
-        for departure_time in valid_times:
-            if departure_time > arrival_time and arrival_time >= terminal_arrival_time and (arrival_time-departure_time) % timedelta(minutes=20) == timedelta(0):
-                domain.append({
-                    'aircraft_name': aircraft_name,
-                    'hangar_assignment': hangar,
-                    'hangar_arrival_time': arrival_time,
-                    'terminal_arrival_time': terminal_arrival_time,
-                    'departure_time': departure_time,
-                    'cargo_amount': cargo_amount
-                })
+        for departure_time in range(arrival_time + 20, last_valid_time + 1, 20):
+            domain.append(AircraftValue(hangar, arrival_time, departure_time))
     # print(domain)
     return domain
 
-def generate_forklift_job_domain(jobtype, job_name, forklifts, hangars, valid_times, associated_job, associated_truck, associated_aircraft, associated_aircraft_data):
-    """Generate the domain for given Forklift Job state variable"""
-    domain = []
+def generate_forklift_job_rows(jobtype, forklifts, hangars, valid_times):
+    """
+    Generate every possible value of a Forklift Job state variable of the given jobtype, as a list of
+    LoadJobValue or UnloadJobValue. Only the fields that vary between values are stored here; the job name
+    and associations are the same for every value, so they are kept in the state variable's metadata instead
+    (see generate_forklift_job_meta).
+    """
     if jobtype == "Load":
         # Generate all possible state combinations
-        for hangar, arrival_time, forklift in product(hangars, valid_times, forklifts):
-            # Ensure departure time is after arrival time
-            # for departure_time in valid_times:
-            if arrival_time >= associated_truck["terminal_arrival_time"]:
-                domain.append({
-                    'job_name': job_name, 
-                    'forklift_name': forklift,
-                    'arrival_time': arrival_time,
-                    'associated_job': associated_job,
-                    'associated_truck_name': associated_truck["name"],
-                    'associated_aircraft_name': associated_aircraft,
-                    'hangar_assignment': hangar,
-                })
+        return [LoadJobValue(forklift, arrival_time, hangar) for hangar, arrival_time, forklift in product(hangars, valid_times, forklifts)]
     elif jobtype == "Unload":
         # Generate all possible state combinations
-        for arrival_time, forklift in product(valid_times, forklifts):
-            if arrival_time >= datetime.strptime(f"{associated_aircraft_data['Time']:04d}", "%H%M"):
-                domain.append({
-                    'job_name': job_name, 
-                    'forklift_name': forklift,
-                    'arrival_time': arrival_time,
-                    'associated_job': associated_job,
-                    'associated_aircraft_name': associated_aircraft
-                })
-    return domain
+        return [UnloadJobValue(forklift, arrival_time) for arrival_time, forklift in product(valid_times, forklifts)]
+    return []
+
+def generate_forklift_job_domain(rows, min_arrival_time):
+    """
+    Generate the domain for given Forklift Job state variable: the rows (from generate_forklift_job_rows)
+    that do not start before min_arrival_time. The row objects are shared by every job variable, but each
+    domain is its own list since the solver prunes domains in place.
+    """
+    return [row for row in rows if row.arrival_time >= min_arrival_time]
+
+def generate_forklift_job_meta(job_name, associated_job, associated_truck, associated_aircraft):
+    """Generate the metadata (fields shared by every domain value) for given Forklift Job state variable"""
+    meta = {
+        'job_name': job_name,
+        'associated_job': associated_job,
+    }
+    if associated_truck is not None:
+        meta['associated_truck_name'] = associated_truck["name"]
+    meta['associated_aircraft_name'] = associated_aircraft
+    return meta
+
+def _aircraft_pair(a, b):
+    """
+    If aircraft a comes in before aircraft b, then aircraft a must leave before aircraft b arrives (and the
+    vice versa situation) unless they are in different hangars.
+    An aircraft always departs after it arrives, so "a leaves before b arrives" already implies a came in first.
+    """
+    return (a.hangar_assignment != b.hangar_assignment or
+            a.departure_time < b.hangar_arrival_time or
+            b.departure_time < a.hangar_arrival_time)
+
+def _unload_pair(a, b):
+    """
+    For 2 unload jobs, either the two forklifts must have diff names, or job b cannot perform an unload within
+    20 minutes after job a, or job a cannot perform an unload within 20 minutes after job b.
+    """
+    return a.forklift_name != b.forklift_name or abs(a.arrival_time - b.arrival_time) >= UNLOAD_DURATION
+
+def _unload_load_pair(a, b):
+    """
+    For an unload job a and load job b, either the two forklifts must have diff names, or job b cannot perform
+    a load within 20 minutes after job a starts unloading, or job a cannot perform an unload within 5 minutes
+    after job b loads.
+    """
+    return (a.forklift_name != b.forklift_name or
+            b.arrival_time >= a.arrival_time + UNLOAD_DURATION or
+            a.arrival_time >= b.arrival_time + LOAD_DURATION)
+
+def _aircraft_pair_mask(a, domain):
+    """
+    _aircraft_pair(a, b) for every b in domain.
+    """
+    hangar, arrival, departure = a.hangar_assignment, a.hangar_arrival_time, a.departure_time
+    return [b.hangar_assignment != hangar or departure < b.hangar_arrival_time or b.departure_time < arrival
+            for b in domain]
+
+def _unload_pair_mask(a, domain):
+    """
+    _unload_pair(a, b) for every b in domain.
+    """
+    forklift, arrival = a.forklift_name, a.arrival_time
+    return [b.forklift_name != forklift or abs(b.arrival_time - arrival) >= UNLOAD_DURATION for b in domain]
+
+def _unload_load_pair_mask(a, domain):
+    """
+    _unload_load_pair(a, b) for every load job b in domain.
+    """
+    forklift, arrival = a.forklift_name, a.arrival_time
+    return [b.forklift_name != forklift or
+            b.arrival_time >= arrival + UNLOAD_DURATION or
+            arrival >= b.arrival_time + LOAD_DURATION
+            for b in domain]
+
+def _unload_load_pair_flipped_mask(b, domain):
+    """
+    _unload_load_pair(a, b) for every unload job a in domain.
+    """
+    forklift, arrival = b.forklift_name, b.arrival_time
+    return [a.forklift_name != forklift or
+            arrival >= a.arrival_time + UNLOAD_DURATION or
+            a.arrival_time >= arrival + LOAD_DURATION
+            for a in domain]
+
+def _unload_before_load(a, b):
+    """
+    For unload job a and associated load job b, the load job must take place after the unload job finishes.
+    """
+    return b.arrival_time > a.arrival_time + MIN_UNLOAD_TO_LOAD_GAP
+
+def _load_pair(a, b):
+    """
+    For 2 load jobs, job b cannot have the same forklift performing a load within 5 minutes after job a (or
+    vice versa), and jobs a and b cannot occur at the same time if they are in the same hangar.
+    Both are checked at once, specialized on whether the two jobs use the same forklift:
+      - same forklift: the jobs must be at least 5 minutes apart, which also means they are not at the same time
+      - diff forklifts: the jobs must be in diff hangars or happen at diff times
+    """
+    if a.forklift_name == b.forklift_name:
+        return abs(a.arrival_time - b.arrival_time) >= LOAD_DURATION
+    return a.hangar_assignment != b.hangar_assignment or b.arrival_time != a.arrival_time
+
+def _load_pair_mask(a, domain):
+    """
+    _load_pair(a, b) for every b in domain.
+    """
+    forklift, hangar, arrival = a.forklift_name, a.hangar_assignment, a.arrival_time
+    return [abs(b.arrival_time - arrival) >= LOAD_DURATION if b.forklift_name == forklift
+            else b.hangar_assignment != hangar or b.arrival_time != arrival
+            for b in domain]
+
+# The pairwise constraints above link every pair of aircraft or jobs, so give them domain-wide
+# versions for forward checking (see csp.with_domain_mask)
+with_domain_mask(_aircraft_pair, _aircraft_pair_mask)
+with_domain_mask(_unload_pair, _unload_pair_mask)
+with_domain_mask(_unload_load_pair, _unload_load_pair_mask, _unload_load_pair_flipped_mask)
+with_domain_mask(_load_pair, _load_pair_mask)
+
+def _aircraft_unload(a, b):
+    """
+    For aircraft a and associated unload job b, the unload must start after the aircraft arrives at the
+    hangar and finish before it departs.
+    """
+    return a.hangar_arrival_time <= b.arrival_time and a.departure_time >= b.arrival_time + UNLOAD_DURATION
+
+def _aircraft_load(a, b):
+    """
+    For aircraft a and associated load job b, the load job must happen at the same hangar as the aircraft,
+    after the plane arrives at the hangar.
+    """
+    return a.hangar_assignment == b.hangar_assignment and a.hangar_arrival_time <= b.arrival_time
+
+def _in_order(a, b):
+    """
+    Job a does not happen after job b.
+    """
+    return a.arrival_time <= b.arrival_time
+
+def forklift_capacity_exceeded(jobs, forklift_count, end_time):
+    """
+    Time-tabling check of the total forklift capacity: all jobs that cannot start before some time t have to be
+    done between t and end_time, with at most forklift_count of them running at once.
+    :param jobs: list of (earliest start time, duration) for every forklift job
+    :param forklift_count: number of forklifts
+    :param end_time: time by which every job has to be finished
+    :return: True if there is more work after some start time than the forklifts can do, False otherwise
+    """
+    work = 0
+    # Latest earliest start first, so work always holds the durations of every job starting at or after it
+    for earliest_start, duration in sorted(jobs, reverse=True):
+        work += duration
+        if work > forklift_count * (end_time - earliest_start):
+            return True
+    return False
+
+def _job_aircraft(aircraft_counts):
+    """
+    The aircraft each forklift job (and so each cargo) belongs to, in job number order.
+    :param aircraft_counts: dict aircraft name -> cargo amount
+    """
+    return (aircraft for aircraft, count in aircraft_counts.items() for _ in range(count))
 
 def build_problem_csp(meta, aircrafts, trucks):
     """
@@ -169,114 +378,158 @@ def build_problem_csp(meta, aircrafts, trucks):
     
     # 1.1) Create state variables for each aircraft X_flight_n
     aircraft_variables = []
-    earliest_aircraft_arrival = meta["Stop Time"]
-    for i, aircraft in enumerate(aircrafts):
-            if aircrafts[aircraft]['Time'] < earliest_aircraft_arrival and aircrafts[aircraft]['Time'] >= meta["Start Time"]:
-                earliest_aircraft_arrival = aircrafts[aircraft]['Time']
-    if earliest_aircraft_arrival == meta["Stop Time"]:
-        earliest_aircraft_arrival = meta["Start Time"]
     all_valid_times = generate_time_intervals(meta["Start Time"], meta["Stop Time"])
     all_hangars = meta["Hangars"]
     total_cargo_amount = 0
-    aircraft_list = []
+    # Number of cargo (and so forklift load/unload job pairs) per aircraft. Jobs are numbered aircraft by aircraft
+    # in this order, so each aircraft owns a consecutive block of job numbers.
+    aircraft_counts = {}
+    # Aircraft that reach the terminal at the same time have the same domain, so it is only generated once
+    aircraft_domains = {}
     for i, aircraft in enumerate(aircrafts):
         aircraft_name = aircraft
         aircraft_cargo_amount = aircrafts[aircraft]["Cargo"]
-        terminal_arrival_time = datetime.strptime(f"{aircrafts[aircraft]['Time']:04d}", "%H%M")
+        terminal_arrival_time = military_to_minutes(aircrafts[aircraft]['Time'])
         total_cargo_amount += aircraft_cargo_amount
-        for _ in range(aircraft_cargo_amount):
-            aircraft_list.append(aircraft)
-        # Domain: all permutations of name, hangar, arrival time, departure time, and cargo amount where name and cargo amount are constants
-        domain = generate_aircraft_domain(all_valid_times, all_hangars, aircraft_name, aircraft_cargo_amount, terminal_arrival_time)
+        aircraft_counts[aircraft] = aircraft_cargo_amount
+        # Domain: all permutations of hangar, arrival time and departure time; name, cargo amount and terminal arrival time are constants kept in metadata
+        if terminal_arrival_time not in aircraft_domains:
+            aircraft_domains[terminal_arrival_time] = generate_aircraft_domain(all_valid_times, all_hangars, terminal_arrival_time)
+        domain = list(aircraft_domains[terminal_arrival_time])
+        aircraft_meta = {'aircraft_name': aircraft_name, 'terminal_arrival_time': terminal_arrival_time, 'cargo_amount': aircraft_cargo_amount}
 
-        aircraft_variables.append(StateVariable(aircraft_name, domain))
+        aircraft_variables.append(StateVariable(aircraft_name, domain, aircraft_meta))
     variables = variables + aircraft_variables
     
     # 1.2) Create state variables for each Truck X_truck_n
     truck_info = []
-    for i, truck in enumerate(trucks_data):
+    for i, truck in enumerate(trucks):
         # We only need one truck per cargo, so if the number of trucks are > total cargo, we don't need state variables for the extra trucks
         if (i >= total_cargo_amount):
             # TODO: NEED TO CHANGE schedule.json TRUCK LOGIC TO HANDLE CASE WHERE NOT ALL TRUCKS HAVE STATE VARS
             break
         truck_name = truck
-        terminal_arrival_time = datetime.strptime(f"{trucks_data[truck]:04d}", "%H%M")
+        terminal_arrival_time = military_to_minutes(trucks[truck])
         truck_info.append({
             "name": truck_name,
             "terminal_arrival_time": terminal_arrival_time
         })    
         
-    total_trucks = len(trucks_data)
+    total_trucks = len(trucks)
     if (total_trucks < total_cargo_amount):
         print("CSP IS NOT SOLVABLE")
         return CSP(variables, {}, {}, False)
-
+    
+    # Jobs of the same aircraft are interchangeable, so within each aircraft's block of jobs the trucks are
+    # ordered by arrival time. This lets the jobs of an aircraft be ordered by time as well (see 2.5) without
+    # losing any solutions.
+    block_start = 0
+    for count in aircraft_counts.values():
+        block = slice(block_start, block_start + count)
+        truck_info[block] = sorted(truck_info[block], key=lambda truck: truck["terminal_arrival_time"])
+        block_start += count
+    
+    # Every cargo needs an unload (after its aircraft reaches the terminal) followed by a load (after its truck
+    # reaches the terminal, and more than MIN_UNLOAD_TO_LOAD_GAP minutes after the unload), all done by the
+    # forklifts before the valid times run out. If that is already too much work for the forklifts, no search
+    # is needed.
+    # Without any valid times there is nothing to check, every domain is empty.
+    if all_valid_times:
+        forklift_jobs = []
+        for job_num, associated_aircraft in enumerate(_job_aircraft(aircraft_counts)):
+            unload_start = max(military_to_minutes(aircrafts[associated_aircraft]['Time']), all_valid_times[0])
+            # The load starts on a valid time more than MIN_UNLOAD_TO_LOAD_GAP minutes after the unload, so at the
+            # earliest on the first TIME_STEP grid point past unload_start + MIN_UNLOAD_TO_LOAD_GAP
+            earliest_load = unload_start + MIN_UNLOAD_TO_LOAD_GAP + 1
+            earliest_load += -(earliest_load - all_valid_times[0]) % TIME_STEP
+            load_start = max(truck_info[job_num]["terminal_arrival_time"], earliest_load)
+            forklift_jobs.append((unload_start, UNLOAD_DURATION))
+            forklift_jobs.append((load_start, LOAD_DURATION))
+        if forklift_capacity_exceeded(forklift_jobs, len(meta["Forklifts"]), all_valid_times[-1] + LOAD_DURATION):
+            print("CSP IS NOT SOLVABLE")
+            return CSP(variables, {}, {}, False)
     
     # 1.3) Create state variables for each Forklift Load Job X_forklift_job_m
     load_job_variables = []
     all_forklifts = meta["Forklifts"]
-    for job_num in range(total_cargo_amount):
+    load_rows = generate_forklift_job_rows("Load", all_forklifts, all_hangars, all_valid_times)
+    # Jobs that cannot start before the same time have the same domain, so it is only filtered once
+    load_domains = {}
+    for job_num, associated_aircraft in enumerate(_job_aircraft(aircraft_counts)):
         var_name = f"forklift_load_job_{job_num}"
         associated_unload = f"forklift_unload_job_{job_num}"
         associated_truck = truck_info[job_num]
-        associated_aircraft = aircraft_list[job_num]
-        domain = generate_forklift_job_domain("Load", var_name, all_forklifts, all_hangars, all_valid_times, associated_unload, associated_truck, associated_aircraft, aircrafts[aircraft])
+        # A load cannot start before its truck reaches the terminal
+        min_arrival_time = associated_truck["terminal_arrival_time"]
+        if min_arrival_time not in load_domains:
+            load_domains[min_arrival_time] = generate_forklift_job_domain(load_rows, min_arrival_time)
+        domain = list(load_domains[min_arrival_time])
+        job_meta = generate_forklift_job_meta(var_name, associated_unload, associated_truck, associated_aircraft)
         
-        load_job_variables.append(StateVariable(var_name, domain))
+        load_job_variables.append(StateVariable(var_name, domain, job_meta))
     variables = variables + load_job_variables
         
     # 1.4) Create state variables for each Forklift Unload Job X_forklift_job_m
     # First, calulate total number of forklift jobs that will need to be created based on total cargo amount
     unload_job_variables = []
     all_forklifts = meta["Forklifts"]
-    for job_num in range(total_cargo_amount):
+    unload_rows = generate_forklift_job_rows("Unload", all_forklifts, None, all_valid_times)
+    unload_domains = {}
+    for job_num, associated_aircraft in enumerate(_job_aircraft(aircraft_counts)):
         var_name = f"forklift_unload_job_{job_num}"
         associated_load = f"forklift_load_job_{job_num}"
-        associated_aircraft = aircraft_list[job_num]
-        domain = generate_forklift_job_domain("Unload", var_name, all_forklifts, None, all_valid_times, associated_load, None, associated_aircraft, aircrafts[aircraft])
-        unload_job_variables.append(StateVariable(var_name, domain))
+        # An unload cannot start before its aircraft reaches the terminal
+        min_arrival_time = military_to_minutes(aircrafts[associated_aircraft]['Time'])
+        if min_arrival_time not in unload_domains:
+            unload_domains[min_arrival_time] = generate_forklift_job_domain(unload_rows, min_arrival_time)
+        domain = list(unload_domains[min_arrival_time])
+        job_meta = generate_forklift_job_meta(var_name, associated_load, None, associated_aircraft)
+        unload_job_variables.append(StateVariable(var_name, domain, job_meta))
     variables = variables + unload_job_variables
     
+    # 1.5) Break the symmetry between forklifts
+    # Forklifts are interchangeable, so renaming them in a schedule gives another valid schedule. Taking the jobs in a
+    # fixed order (unload jobs, then load jobs) and naming the forklifts in order of first use, the k-th job never needs
+    # a forklift past the first k + 1, so only those are kept in its domain.
+    for k, var in enumerate(unload_job_variables + load_job_variables):
+        if k + 1 >= len(all_forklifts):
+            break
+        usable_forklifts = set(all_forklifts[:k + 1])
+        var.domain[:] = [value for value in var.domain if value.forklift_name in usable_forklifts]
+    
     # 2) Build all constraints
     
     # Inititalize where to store all unary and binary constraints
-    binary_constraints = {}
-    unary_constraints = {}
-    for var in variables:
-        binary_constraints[var.name] = []
-        unary_constraints[var.name] = []
+    # (CSP fills in an empty list for any variable that ends up without constraints)
+    binary_constraints = defaultdict(list)
+    unary_constraints = defaultdict(list)
         
+    # The forklifts and hangars each variable can still take. A pair constraint that only matters when two
+    # variables use the same forklift (or hangar) is not posted if their domains have none in common.
+    forklifts_in_domain = {var.name: {value.forklift_name for value in var.domain} for var in load_job_variables + unload_job_variables}
+    hangars_in_domain = {var.name: {value.hangar_assignment for value in var.domain} for var in load_job_variables}
+    hangars_in_domain.update({var.name: {value.hangar_assignment for value in var.domain} for var in aircraft_variables})
+    
     # 2.1) build out all aircraft specific constraints
     total_aircraft_vars = len(aircraft_variables)
     # Build out all aircraft state variable pair constraints
     for i in range(total_aircraft_vars):
         aircraft_a = aircraft_variables[i].name
-        # Constraint: plane cannot go to the hangar before it arrives at the terminal
-        unary_constraints[aircraft_a].append(
-            (lambda a: a["terminal_arrival_time"] <= a["hangar_arrival_time"])
-        )
+        # A plane cannot go to the hangar before it arrives at the terminal, this is enforced by
+        # generate_aircraft_domain so it does not need a unary constraint
         for j in range(i + 1, total_aircraft_vars):
             
             aircraft_b = aircraft_variables[j].name
+            if not hangars_in_domain[aircraft_a] & hangars_in_domain[aircraft_b]:
+                continue
             
-            print(f"Pair: {aircraft_a} and {aircraft_b}")
             # Constraint: if aircraft A comes in before aircraft B, then aircraft A must leave before aircraft B arr time and the vice versa situation unless they are in different hangars
             # binary_constraints[aircraft_a].append(
             #     (aircraft_b, lambda a, b: 
             #         ((a["hangar_arrival_time"] < b["hangar_arrival_time"] and a["departure_time"] < b["hangar_arrival_time"]) or (not a["hangar_assignment"] == b["hangar_assignment"])) or
             #         ((a["hangar_arrival_time"] > b["hangar_arrival_time"] and b["departure_time"] < a["hangar_arrival_time"]) or (not a["hangar_assignment"] == b["hangar_assignment"]))
             #     )
-            binary_constraints[aircraft_a].append(
-                (aircraft_b, lambda a, b: 
-                    # either they are not in the same hangar in which case we do not care about overlapping arrival times
-                    (not a["hangar_assignment"] == b["hangar_assignment"]) or
-                    # or they are in the same hangar in which case:
-                    # a) if a arrives before b, then a must depart before b 
-                    (((not a["hangar_arrival_time"] < b["hangar_arrival_time"]) or (a["departure_time"] < b["hangar_arrival_time"])) and
-                    ((not a["hangar_arrival_time"] > b["hangar_arrival_time"]) or (b["departure_time"] < a["hangar_arrival_time"])) and
-                    (not a["hangar_arrival_time"] == b["hangar_arrival_time"]))
-                )
-            )
+            binary_constraints[aircraft_a].append((aircraft_b, _aircraft_pair))
     
     # 2.3) build out all forklift unload job specific constraints
     total_unload_vars = len(unload_job_variables)
@@ -287,35 +540,23 @@ def build_problem_csp(meta, aircrafts, trucks):
         # For (unload, unload) pairs
         for j in range(i + 1, total_unload_vars):
             unload_job_b = unload_job_variables[j].name
+            if not forklifts_in_domain[unload_job_a] & forklifts_in_domain[unload_job_b]:
+                continue
             # Constraint: for 2 unload job, job b cannot have the same forklift performing an unload within 20 minutes after job a
-            binary_constraints[unload_job_a].append(
-                (unload_job_b, lambda a, b: 
-                    # either the two forklifts must have diff names or job b cannot perform an unload within 20 minutes after job a
-                    ((not a["forklift_name"] == b["forklift_name"]) or (b["arrival_time"] >= a["arrival_time"] + timedelta(minutes=20))) or
-                    # either the two forklifts must have diff names or job a cannot perform an unload within 20 minutes after job b
-                    ((not a["forklift_name"] == b["forklift_name"]) or (a["arrival_time"] >= b["arrival_time"] + timedelta(minutes=20)))
-                )
-            )
+            binary_constraints[unload_job_a].append((unload_job_b, _unload_pair))
         # For (unload, load) pairs
         for k in range(total_load_vars):
             load_job_b = load_job_variables[k].name
+            if not forklifts_in_domain[unload_job_a] & forklifts_in_domain[load_job_b]:
+                continue
             # Constraint: for an unload job a and load job b, job b cannot have the same forklift performing an load within 20 minutes after job a
             #             or job a cannot have the same forklift performing an unload within 5 minutes after job b
-            binary_constraints[unload_job_a].append(
-                (load_job_b, lambda a, b: 
-                    # either the two forklifts must have diff names or job b cannot perform an load within 20 minutes after job a starts unloading
-                    ((not a["forklift_name"] == b["forklift_name"]) or (b["arrival_time"] >= a["arrival_time"] + timedelta(minutes=20))) or
-                    # either the two forklifts must have diff names or job a cannot perform an unload within 5 minutes after job b unloads
-                    ((not a["forklift_name"] == b["forklift_name"]) or (a["arrival_time"] >= b["arrival_time"] + timedelta(minutes=5)))
-                )
-            )
-            # Constraint: for unload job a and associated load job b, the load job must take place after the unload job finishes
-            binary_constraints[unload_job_a].append(
-                (load_job_b, lambda a, b: 
-                    # 
-                    ((not a["job_name"] == b["associated_job"]) or (b["arrival_time"] > a["arrival_time"]+ timedelta(minutes=15)))
-                )
-            )
+            binary_constraints[unload_job_a].append((load_job_b, _unload_load_pair))
+    
+    # Constraint: for unload job a and associated load job b, the load job must take place after the unload job finishes
+    # Unload and load jobs with the same job number are associated, so this is only posted once per job number
+    for job_num in range(total_cargo_amount):
+        binary_constraints[f"forklift_unload_job_{job_num}"].append((f"forklift_load_job_{job_num}", _unload_before_load))
     
     # 2.3) build out all forklift load job specific constraints    
     for i in range(total_load_vars):
@@ -323,86 +564,96 @@ def build_problem_csp(meta, aircrafts, trucks):
 
         for j in range(i + 1, total_load_vars):
             load_job_b = load_job_variables[j].name
+            if not (forklifts_in_domain[load_job_a] & forklifts_in_domain[load_job_b] or
+                    hangars_in_domain[load_job_a] & hangars_in_domain[load_job_b]):
+                continue
             # Constraint: for a load job a and load job b, job b cannot have the same forklift performing an load within 5 minutes after job a
             #             or job a cannot have the same forklift performing an oad within 5 minutes after job b
-            binary_constraints[load_job_a].append(
-                (load_job_b, lambda a, b: 
-                    # either the two forklifts must have diff names or job b cannot perform an unload within 20 minutes after job a
-                    ((not a["forklift_name"] == b["forklift_name"]) or (b["arrival_time"] >= a["arrival_time"] + timedelta(minutes=5))) or
-                    # either the two forklifts must have diff names or job a cannot perform an unload within 20 minutes after job b
-                    ((not a["forklift_name"] == b["forklift_name"]) or (a["arrival_time"] >= b["arrival_time"] + timedelta(minutes=5)))
-                )
-            )
             # Constraint: for a load job a and load job b, jobs a and b cannot occur at the same time if they are in the same hangar
-            binary_constraints[load_job_a].append(
-                (load_job_b, lambda a, b: 
-                    # either the two forklifts must have diff hangars or job a and b cannot happen at the same time
-                    (not a["hangar_assignment"] == b["hangar_assignment"]) or (not b["arrival_time"] == a["arrival_time"])
-                )
-            )
+            # Both are checked in one constraint (see _load_pair)
+            binary_constraints[load_job_a].append((load_job_b, _load_pair))
     
     # 2.4) Build out all aircraft to job constraints
     for i in range(total_aircraft_vars):
         aircraft_a = aircraft_variables[i].name
         # For (aircraft, unload) pairs
+        # Jobs are associated with aircraft before solving, so these constraints are only posted for associated pairs
         for j in range(0, total_unload_vars):
             unload_job_b = unload_job_variables[j].name
+            if unload_job_variables[j].meta["associated_aircraft_name"] != aircraft_a:
+                continue
             # Constraint 1: if an associated aircraft unload  job pair, the load job must start after the aircraft lands
-            binary_constraints[aircraft_a].append(
-                (unload_job_b, lambda a, b: 
-                    ((not a["aircraft_name"] == b["associated_aircraft_name"]) or ((a["hangar_arrival_time"] <= b["arrival_time"]) and (a["departure_time"] >= b["arrival_time"]+timedelta(minutes=20))))
-                )
-            )
+            binary_constraints[aircraft_a].append((unload_job_b, _aircraft_unload))
         # For (aircraft, load) pairs
         for k in range(total_load_vars):
             load_job_b = load_job_variables[k].name
-            # Constraint 1: if an associated aircraft load job pair, the load job must start after the aircraft lands
-            binary_constraints[aircraft_a].append(
-                (load_job_b, lambda a, b: 
-                    # either the aircraft and load job are not associated, or the load job must happen after the plane arrives at the hangar
-                    ((not a["aircraft_name"] == b["associated_aircraft_name"]) or ((a["hangar_arrival_time"] <= b["arrival_time"])))
-                )
-            )
-            # Constraint 2: if an associated aircraft load job pair, the load job must happen at the same hangar as the aircraft 
-            binary_constraints[aircraft_a].append(
-                (load_job_b, lambda a, b: 
-                    ((not a["aircraft_name"] == b["associated_aircraft_name"]) or (a["hangar_assignment"] == b["hangar_assignment"]))
-                )
-            )
-            
+            if load_job_variables[k].meta["associated_aircraft_name"] != aircraft_a:
+                continue
+            # Constraint: if an associated aircraft load job pair, the load job must happen at the same hangar as the aircraft
+            #             and start after the aircraft lands
+            binary_constraints[aircraft_a].append((load_job_b, _aircraft_load))
+    
+    # 2.5) Break the symmetry between jobs of the same aircraft
+    # Swapping the times and forklifts of two such jobs gives another valid schedule, so only the one where
+    # consecutive jobs of an aircraft happen in order is searched.
+    block_start = 0
+    for count in aircraft_counts.values():
+        for job_num in range(block_start, block_start + count - 1):
+            binary_constraints[f"forklift_load_job_{job_num}"].append((f"forklift_load_job_{job_num + 1}", _in_order))
+            binary_constraints[f"forklift_unload_job_{job_num}"].append((f"forklift_unload_job_{job_num + 1}", _in_order))
+        block_start += count
+    
+    # 3) Order the variables so the most constrained ones come first: smallest domain, then the most constraints
+    #    (minimum remaining values with the degree heuristic as a tie breaker, decided once before solving)
+    degree = defaultdict(int)
+    for var_name, constraints in binary_constraints.items():
+        for neighbor, _ in constraints:
+            degree[var_name] += 1
+            degree[neighbor] += 1
+    variables.sort(key=lambda var: (len(var.domain), -degree[var.name]))
             
     return CSP(variables, binary_constraints, unary_constraints, solvable)
 
 
-if __name__ == "__main__":
-    if len(sys.argv) != 5:
-        print("Please use this script as such: terminalScheduler.py META_PATH AIRCRAFT_PATH TRUCKS_PATH SCHEDULE_PATH")
-        sys.exit(1)
-    meta_path, aircraft_path, trucks_path, schedule_path = sys.argv[1:]
+def main(meta_path, aircraft_path, trucks_path, schedule_path):
+    """
+    Solve the scheduling problem described by the given input files and write the schedule to schedule_path
+    (and the raw CSP solution to solution.json).
+    """
     meta_data = load_json(meta_path)
     aircraft_data = load_json(aircraft_path)
     trucks_data = load_json(trucks_path)
     
     csp = build_problem_csp(meta_data, aircraft_data, trucks_data)
     
-    solver = BacktrackingSolver()
+    solver = BacktrackingSolver(mrv=True, lcv=True)
     # solution = solver.naive_solve(csp, 0)
     # print("Solution:", solution)
     solution = solver.solve_with_forward_checking(csp, 0)
     # print("Solution:", solution)
     
-    with open("solution.json", 'w') as file:
-        json.dump(convert_datetimes(solution), file, indent=4)
+    # Put each variable's metadata back into its assigned value so the solution is self contained
+    for var in csp.variables:
+        value = solution.get(var.name)
+        if value is None:
+            continue
+        if isinstance(value, tuple):
+            value = value._asdict()
+        if var.meta:
+            solution[var.name] = {**var.meta, **value}
+    
+    dump_json(convert_times(solution), "solution.json")
     
     # insert code to create schedule here
+    load_jobs_by_truck, jobs_by_forklift = index_solution(solution)
     schedule = {"aircraft": {}, "trucks": {}, "forklifts": {}}
     
     for aircraft in aircraft_data:
         if aircraft in solution:
             schedule["aircraft"][aircraft] = {
                 "Hangar": solution[aircraft]["hangar_assignment"],
-                "Arrival": datetime_to_military(solution[aircraft]["hangar_arrival_time"]),
-                "Departure": datetime_to_military(solution[aircraft]["departure_time"])
+                "Arrival": minutes_to_military(solution[aircraft]["hangar_arrival_time"]),
+                "Departure": minutes_to_military(solution[aircraft]["departure_time"])
                 
             }
         else: 
@@ -410,31 +661,34 @@ if __name__ == "__main__":
         
     for truck in trucks_data:
         # assign a load job to each truck. That load job's arrival will be the same as this trucks arrival and departure will be 5 mins after
-        associated_load = find_associated_load_job(solution, truck)
-        print(f"truck: {truck}")
+        associated_load = find_associated_load_job(load_jobs_by_truck, truck)
         if associated_load:  
             associated_aircraft = find_associated_aircraft(solution, associated_load['associated_aircraft_name'])
             schedule["trucks"][truck] = {
                 "Hangar": associated_aircraft['hangar_assignment'],
-                "Arrival": datetime_to_military(associated_load['arrival_time']),
-                "Departure": datetime_to_military(associated_load['arrival_time']+timedelta(minutes=5))
+                "Arrival": minutes_to_military(associated_load['arrival_time']),
+                "Departure": minutes_to_military(associated_load['arrival_time'] + LOAD_DURATION)
             }
         else:
             schedule["trucks"] = None
             print("could not find load")
-        print()
         
     no_forklifts_scheduled = True
     for forklift in meta_data["Forklifts"]:
-        associated_jobs = find_forklift_jobs(solution, forklift)
+        associated_jobs = find_forklift_jobs(solution, jobs_by_forklift, forklift)
         if associated_jobs:
             schedule["forklifts"][forklift] = associated_jobs
             no_forklifts_scheduled = False
     if no_forklifts_scheduled:
         schedule["forklifts"] = None
             
-    with open(schedule_path, 'w') as file:
-        json.dump(schedule, file, indent=4)
+    dump_json(schedule, schedule_path)
         
     print(f"Schedule written to {schedule_path}")
-    
\ No newline at end of file
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 5:
+        print("Please use this script as such: terminalScheduler.py META_PATH AIRCRAFT_PATH TRUCKS_PATH SCHEDULE_PATH")
+        sys.exit(1)
+    main(*sys.argv[1:])